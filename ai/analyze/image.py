@@ -1,7 +1,9 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import json
 import random
 
+from analyze.palette import PaletteClusterer
+
 # 実際の実装ではPillowやTensorFlow/PyTorchなどを使って画像分析を行う
 # ここではモックデータを返すだけの簡易実装
 
@@ -18,6 +20,14 @@ def extract_colors(image_path: str) -> List[str]:
     num_colors = random.randint(4, 6)
     return random.sample(mock_colors, num_colors)
 
+def extract_dominant_colors(image_path: str) -> List[Tuple[str, float]]:
+    """画像から主要な色と画素に占める割合を抽出する（モック）"""
+    # 実際の実装ではPillowで減色した各色の画素数から割合を求める
+    colors = extract_colors(image_path)
+    shares = [random.uniform(0.1, 1) for _ in colors]
+    total = sum(shares)
+    return [(color, share / total) for color, share in zip(colors, shares)]
+
 def analyze_style(image_path: str) -> Dict[str, float]:
     """画像のスタイルを分析する（モック）"""
     # 実際の実装では事前学習済みモデルを使用して画像スタイルを判定
@@ -49,16 +59,28 @@ def extract_themes(image_path: str) -> List[Dict[str, float]]:
     themes.sort(key=lambda x: x["confidence"], reverse=True)
     return themes[:3]  # 上位3つのみ返す
 
-def analyze_image_trends(image_paths: List[str]) -> Dict[str, Any]:
-    """複数の画像からトレンドを分析する"""
+def analyze_image_trends(
+    image_paths: List[str],
+    palette_clusterer: Optional[PaletteClusterer] = None,
+    palette_count: int = 2,
+) -> Dict[str, Any]:
+    """複数の画像からトレンドを分析する
+
+    palette_clusterer を渡すと、以前に追加された画像の色に今回の画像の色を
+    追加した上でパレットを作成する（コレクションへの逐次追加用）
+    """
+    if palette_clusterer is None:
+        palette_clusterer = PaletteClusterer()
     all_colors = []
+    all_shares = []
     style_scores = {}
     all_themes = []
     
     for image_path in image_paths:
-        # 色抽出
-        colors = extract_colors(image_path)
-        all_colors.extend(colors)
+        # 色抽出（画素の割合を重みとする）
+        for color, share in extract_dominant_colors(image_path):
+            all_colors.append(color)
+            all_shares.append(share)
         
         # スタイル分析
         styles = analyze_style(image_path)
@@ -72,23 +94,9 @@ def analyze_image_trends(image_paths: List[str]) -> Dict[str, Any]:
         themes = extract_themes(image_path)
         all_themes.extend(themes)
     
-    # 色の集計（重複を除去して頻度順）
-    color_counter = {}
-    for color in all_colors:
-        color_counter[color] = color_counter.get(color, 0) + 1
-    
-    sorted_colors = sorted(color_counter.items(), key=lambda x: x[1], reverse=True)
-    unique_colors = [color for color, _ in sorted_colors]
-    
-    # カラーパレットを作成
-    color_palettes = []
-    if len(unique_colors) >= 4:
-        palette1 = {"name": "トレンドパレット1", "colors": unique_colors[:4]}
-        color_palettes.append(palette1)
-    
-    if len(unique_colors) >= 8:
-        palette2 = {"name": "トレンドパレット2", "colors": unique_colors[4:8]}
-        color_palettes.append(palette2)
+    # カラーパレットを作成（CIELAB空間で近い色をまとめてクラスタリング）
+    palette_clusterer.add_colors(all_colors, all_shares)
+    color_palettes = palette_clusterer.build_palettes(count=palette_count)
     
     # スタイルの集計
     total_images = len(image_paths)
@@ -122,7 +130,7 @@ def analyze_image_trends(image_paths: List[str]) -> Dict[str, Any]:
         "themes": themes
     }
 
-# テスト用
+# テスト用（ai/ ディレクトリで python -m analyze.image として実行）
 if __name__ == "__main__":
     # 実際のパスを使用する代わりにダミーパスのリスト
     test_image_paths = ["image1.jpg", "image2.jpg", "image3.jpg"]
@@ -0,0 +1,291 @@
+from typing import List, Dict, Any, Optional, Sequence
+import numpy as np
+
+# 画像コレクション全体の主要色をCIELAB空間でクラスタリングしてパレットを作る
+# 見た目がほぼ同じ色はLab空間の量子化グリッドで1つのビンにまとめるため、
+# サンプル数が数百万でもクラスタリング対象はビン数（ΔE 2の幅で最大10万程度）に抑えられる
+
+# sRGB(D65) -> XYZ 変換行列
+_RGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+])
+_XYZ_TO_RGB = np.linalg.inv(_RGB_TO_XYZ)
+_WHITE_D65 = np.array([0.95047, 1.0, 1.08883])
+
+_EPSILON = 216 / 24389
+_KAPPA = 24389 / 27
+
+# ビンのキーは各軸のセル番号を10ビットずつ詰めて作るため、セル番号が
+# [0, 1024) に収まる量子化幅が必要（sRGBのLabは L: 0-100、a/b: およそ -128-128）
+_KEY_BITS = 10
+_KEY_OFFSET = 1 << (_KEY_BITS - 1)
+MIN_BIN_SIZE = 0.5
+
+
+def hex_to_rgb(hex_colors: Sequence[str]) -> np.ndarray:
+    """HEXカラーコード配列を0-1のRGB配列 (N, 3) に変換する
+
+    #RGB の短縮形は #RRGGBB に展開し、それ以外の長さは ValueError とする
+    """
+    codes = np.fromiter(
+        (int(_normalize_hex(color), 16) for color in hex_colors),
+        dtype=np.int64,
+        count=len(hex_colors),
+    )
+    channels = np.stack([(codes >> 16) & 0xFF, (codes >> 8) & 0xFF, codes & 0xFF], axis=1)
+    return channels / 255.0
+
+
+def _normalize_hex(color: str) -> str:
+    digits = color.lstrip("#")
+    if len(digits) == 3:
+        return "".join(digit * 2 for digit in digits)
+    if len(digits) != 6:
+        raise ValueError(f"不正なHEXカラーコードです: {color!r}")
+    return digits
+
+
+def rgb_to_hex(rgb: np.ndarray) -> List[str]:
+    """0-1のRGB配列 (N, 3) をHEXカラーコード配列に変換する"""
+    channels = np.clip(np.rint(np.asarray(rgb) * 255), 0, 255).astype(np.int64)
+    return ["#{:02X}{:02X}{:02X}".format(*row) for row in channels]
+
+
+def rgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """sRGB (0-1) をCIELAB (D65) に変換する"""
+    rgb = np.asarray(rgb, dtype=np.float64)
+    linear = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    xyz = linear @ _RGB_TO_XYZ.T / _WHITE_D65
+    f = np.where(xyz > _EPSILON, np.cbrt(xyz), (_KAPPA * xyz + 16) / 116)
+    return np.stack([
+        116 * f[:, 1] - 16,
+        500 * (f[:, 0] - f[:, 1]),
+        200 * (f[:, 1] - f[:, 2]),
+    ], axis=1)
+
+
+def lab_to_rgb(lab: np.ndarray) -> np.ndarray:
+    """CIELAB (D65) をsRGB (0-1) に変換する（色域外はクリップ）"""
+    lab = np.asarray(lab, dtype=np.float64)
+    fy = (lab[:, 0] + 16) / 116
+    f = np.stack([fy + lab[:, 1] / 500, fy, fy - lab[:, 2] / 200], axis=1)
+    xyz = np.where(f ** 3 > _EPSILON, f ** 3, (116 * f - 16) / _KAPPA) * _WHITE_D65
+    linear = np.clip(xyz @ _XYZ_TO_RGB.T, 0, 1)
+    return np.where(linear <= 0.0031308, linear * 12.92, 1.055 * linear ** (1 / 2.4) - 0.055)
+
+
+def weighted_kmeans(
+    points: np.ndarray,
+    weights: np.ndarray,
+    k: int,
+    init: Optional[np.ndarray] = None,
+    max_iter: int = 50,
+    tol: float = 1e-3,
+    seed: int = 0,
+) -> Dict[str, np.ndarray]:
+    """重み付きk-means（k-means++初期化、ベクトル化したLloyd法）
+
+    戻り値は centers (k, d)、cluster_weights (k,)、labels (N,)
+    """
+    points = np.asarray(points, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    k = min(k, len(points))
+    if k == 0:
+        return {
+            "centers": np.empty((0, points.shape[1])),
+            "cluster_weights": np.empty(0),
+            "labels": np.empty(0, dtype=np.int64),
+        }
+
+    rng = np.random.default_rng(seed)
+    if init is not None and len(init) >= k:
+        centers = np.array(init[:k], dtype=np.float64)
+    else:
+        centers = _kmeans_plus_plus(points, weights, k, rng)
+
+    point_norms = np.einsum("ij,ij->i", points, points)
+    for _ in range(max_iter):
+        # ||x - c||^2 = ||x||^2 - 2x・c + ||c||^2
+        distances = (
+            point_norms[:, None]
+            - 2 * points @ centers.T
+            + np.einsum("ij,ij->i", centers, centers)[None, :]
+        )
+        labels = np.argmin(distances, axis=1)
+
+        cluster_weights = np.bincount(labels, weights=weights, minlength=k)
+        sums = np.stack([
+            np.bincount(labels, weights=weights * points[:, dim], minlength=k)
+            for dim in range(points.shape[1])
+        ], axis=1)
+
+        new_centers = centers.copy()
+        filled = cluster_weights > 0
+        new_centers[filled] = sums[filled] / cluster_weights[filled, None]
+
+        # 空のクラスタは現在最も誤差の大きい点で再初期化する
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            errors = distances[np.arange(len(points)), labels] * weights
+            for index, point_index in zip(empty, np.argsort(errors)[::-1]):
+                new_centers[index] = points[point_index]
+
+        shift = np.max(np.linalg.norm(new_centers - centers, axis=1))
+        centers = new_centers
+        if shift < tol and not len(empty):
+            break
+
+    distances = (
+        point_norms[:, None]
+        - 2 * points @ centers.T
+        + np.einsum("ij,ij->i", centers, centers)[None, :]
+    )
+    labels = np.argmin(distances, axis=1)
+    return {
+        "centers": centers,
+        "cluster_weights": np.bincount(labels, weights=weights, minlength=k),
+        "labels": labels,
+    }
+
+
+def _kmeans_plus_plus(
+    points: np.ndarray, weights: np.ndarray, k: int, rng: np.random.Generator
+) -> np.ndarray:
+    """重み付きk-means++で初期中心を選ぶ"""
+    probabilities = weights / weights.sum()
+    centers = [points[rng.choice(len(points), p=probabilities)]]
+    closest = np.sum((points - centers[0]) ** 2, axis=1)
+    for _ in range(1, k):
+        scores = closest * weights
+        total = scores.sum()
+        if total <= 0:
+            break
+        center = points[rng.choice(len(points), p=scores / total)]
+        centers.append(center)
+        closest = np.minimum(closest, np.sum((points - center) ** 2, axis=1))
+    centers = np.array(centers)
+    if len(centers) < k:
+        # 区別できる点が足りない場合は重い点で埋める
+        extra = points[np.argsort(weights)[::-1][: k - len(centers)]]
+        centers = np.vstack([centers, extra])
+    return centers
+
+
+class PaletteClusterer:
+    """色サンプルをLabグリッドに蓄積し、知覚的に一貫したパレットを生成する
+
+    add_colors / add_rgb で追加した色は一旦バッファに溜め、ビンへの集計は
+    build_palettes などで必要になった時にまとめて行う。
+    build_palettes は前回のクラスタ中心から再開するため追加分のみの更新が軽い
+    """
+
+    def __init__(self, bin_size: float = 2.0, seed: int = 0):
+        # bin_size はLab空間での量子化幅（ΔE約2以下の差は人間にはほぼ識別できない）
+        if bin_size < MIN_BIN_SIZE:
+            raise ValueError(f"bin_size は {MIN_BIN_SIZE} 以上を指定してください: {bin_size}")
+        self.bin_size = bin_size
+        self.seed = seed
+        self._keys = np.empty(0, dtype=np.int64)
+        self._weights = np.empty(0)
+        self._lab_sums = np.empty((0, 3))
+        self._pending: List[np.ndarray] = []
+        self._pending_weights: List[np.ndarray] = []
+        self._group_centers: Optional[np.ndarray] = None
+
+    @property
+    def total_weight(self) -> float:
+        self._flush()
+        return float(self._weights.sum())
+
+    @property
+    def bin_count(self) -> int:
+        self._flush()
+        return len(self._keys)
+
+    def add_colors(self, hex_colors: Sequence[str], weights: Optional[Sequence[float]] = None) -> None:
+        """HEXカラーと重み（画素シェア）を追加する"""
+        if len(hex_colors) == 0:
+            return
+        self.add_rgb(hex_to_rgb(hex_colors), weights)
+
+    def add_rgb(self, rgb: np.ndarray, weights: Optional[Sequence[float]] = None) -> None:
+        """0-1のRGB配列 (N, 3) と重みを追加する"""
+        lab = rgb_to_lab(rgb)
+        weights = np.ones(len(lab)) if weights is None else np.asarray(weights, dtype=np.float64)
+        valid = weights > 0
+        lab, weights = lab[valid], weights[valid]
+        if len(lab) == 0:
+            return
+
+        self._pending.append(lab)
+        self._pending_weights.append(weights)
+
+    def _flush(self) -> None:
+        """バッファの色をビンに集計する"""
+        if not self._pending:
+            return
+        lab = np.concatenate(self._pending)
+        weights = np.concatenate(self._pending_weights)
+        self._pending, self._pending_weights = [], []
+
+        # Labをグリッドに量子化し、追加分だけをキーごとに集計する
+        cells = np.floor(lab / self.bin_size).astype(np.int64) + _KEY_OFFSET
+        keys = (cells[:, 0] << (2 * _KEY_BITS)) | (cells[:, 1] << _KEY_BITS) | cells[:, 2]
+        new_keys, inverse = np.unique(keys, return_inverse=True)
+        new_weights = np.bincount(inverse, weights=weights, minlength=len(new_keys))
+        new_sums = np.stack([
+            np.bincount(inverse, weights=weights * lab[:, dim], minlength=len(new_keys))
+            for dim in range(3)
+        ], axis=1)
+
+        # 既存のビンは加算し、未出現のキーだけをソート順を保って挿入する
+        positions = np.searchsorted(self._keys, new_keys)
+        exists = positions < len(self._keys)
+        exists[exists] = self._keys[positions[exists]] == new_keys[exists]
+        np.add.at(self._weights, positions[exists], new_weights[exists])
+        np.add.at(self._lab_sums, positions[exists], new_sums[exists])
+
+        fresh = ~exists
+        if fresh.any():
+            self._keys = np.insert(self._keys, positions[fresh], new_keys[fresh])
+            self._weights = np.insert(self._weights, positions[fresh], new_weights[fresh])
+            self._lab_sums = np.insert(self._lab_sums, positions[fresh], new_sums[fresh], axis=0)
+
+    def build_palettes(self, count: int = 2, colors_per_palette: int = 4) -> List[Dict[str, Any]]:
+        """蓄積した色から count 個のパレットを生成する
+
+        まず色全体を count 個の色グループにクラスタリングし、
+        各グループ内をさらに colors_per_palette 色にクラスタリングする。
+        popularity はグループが占める重みの割合。
+        ビンが足りない場合、パレット数は count 未満、各パレットの色数は
+        1〜colors_per_palette 色になる
+        """
+        total = self.total_weight
+        if total <= 0 or count <= 0:
+            return []
+
+        bin_labs = self._lab_sums / self._weights[:, None]
+        groups = weighted_kmeans(bin_labs, self._weights, count,
+                                 init=self._group_centers, seed=self.seed)
+        self._group_centers = groups["centers"]
+
+        palettes = []
+        for group_index in np.argsort(groups["cluster_weights"])[::-1]:
+            group_weight = groups["cluster_weights"][group_index]
+            if group_weight <= 0:
+                continue
+            members = groups["labels"] == group_index
+            shades = weighted_kmeans(bin_labs[members], self._weights[members],
+                                     colors_per_palette, seed=self.seed)
+            order = np.argsort(shades["cluster_weights"])[::-1]
+            order = order[shades["cluster_weights"][order] > 0]
+            colors = rgb_to_hex(lab_to_rgb(shades["centers"][order]))
+            palettes.append({
+                "name": f"トレンドパレット{len(palettes) + 1}",
+                # 量子化後のLab中心が同じHEXに丸められることがあるため重複を除く
+                "colors": list(dict.fromkeys(colors)),
+                "popularity": float(group_weight / total),
+            })
+        return palettes
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from analyze.palette import PaletteClusterer, hex_to_rgb, lab_to_rgb, rgb_to_lab
+
+
+def test_lab_round_trip():
+    rgb = np.random.default_rng(0).random((1000, 3))
+    assert np.allclose(lab_to_rgb(rgb_to_lab(rgb)), rgb, atol=1e-9)
+
+
+def test_white_is_neutral():
+    lab = rgb_to_lab(np.array([[1.0, 1.0, 1.0]]))[0]
+    assert lab == pytest.approx([100.0, 0.0, 0.0], abs=1e-3)
+
+
+def test_hex_shorthand_is_expanded():
+    assert np.allclose(hex_to_rgb(["#FFF", "#0F0"]), [[1, 1, 1], [0, 1, 0]])
+
+
+def test_invalid_hex_is_rejected():
+    with pytest.raises(ValueError):
+        hex_to_rgb(["#FFFF"])
+
+
+def test_small_bin_size_is_rejected():
+    with pytest.raises(ValueError):
+        PaletteClusterer(bin_size=0.1)
+
+
+def test_near_identical_colors_share_a_bin():
+    clusterer = PaletteClusterer()
+    clusterer.add_colors(["#3366CC", "#3466CC"])
+    assert clusterer.bin_count == 1
+
+    clusterer.add_colors(["#FF0000", "#0000FF"])
+    assert clusterer.bin_count == 3
+
+
+def test_popularity_sums_to_one():
+    rng = np.random.default_rng(1)
+    clusterer = PaletteClusterer()
+    clusterer.add_rgb(rng.random((5000, 3)), rng.random(5000))
+    palettes = clusterer.build_palettes(count=3)
+    assert len(palettes) == 3
+    assert all(len(palette["colors"]) == 4 for palette in palettes)
+    assert sum(palette["popularity"] for palette in palettes) == pytest.approx(1.0)
+
+
+def test_incremental_add_matches_single_add():
+    rng = np.random.default_rng(2)
+    rgb = rng.random((2000, 3))
+    weights = rng.random(2000)
+
+    combined = PaletteClusterer()
+    combined.add_rgb(rgb, weights)
+    combined._flush()
+
+    incremental = PaletteClusterer()
+    incremental.add_rgb(rgb[:1000], weights[:1000])
+    incremental._flush()
+    incremental.add_rgb(rgb[1000:], weights[1000:])
+    incremental._flush()
+
+    assert np.array_equal(incremental._keys, combined._keys)
+    assert np.allclose(incremental._weights, combined._weights)
+    assert np.allclose(incremental._lab_sums, combined._lab_sums)
+
+
+def test_fewer_bins_than_requested():
+    clusterer = PaletteClusterer()
+    clusterer.add_colors(["#FF0000", "#00FF00", "#0000FF"], [3, 2, 1])
+
+    palettes = clusterer.build_palettes(count=5, colors_per_palette=4)
+    assert len(palettes) == 3
+    assert [palette["colors"] for palette in palettes] == [["#FF0000"], ["#00FF00"], ["#0000FF"]]
+
+    palettes = clusterer.build_palettes(count=1, colors_per_palette=4)
+    assert len(palettes) == 1
+    assert sorted(palettes[0]["colors"]) == ["#0000FF", "#00FF00", "#FF0000"]
+
+
+def test_empty_clusterer_has_no_palettes():
+    assert PaletteClusterer().build_palettes() == []
@@ -14,8 +14,9 @@ export interface Theme {
 // カラーパレット
 export interface ColorPalette {
   name: string;
-  colors: string[]; // HEXカラーコード配列
+  colors: string[]; // HEXカラーコード配列（AI分析の結果は色数が1〜4色で変わる）
   description?: string;
+  popularity?: number; // コレクション内で占める割合 (0-1)
 }
 
 // ビジュアルスタイル